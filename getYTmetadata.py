@@ -1,10 +1,18 @@
 #!/usr/bin/env python
 
+from collections import Counter
 from datetime import datetime
+from hashlib import blake2b
 from json import dump
+from math import ceil, log
+from os.path import exists, join
+from re import compile as re_compile
 from requests import exceptions
+from shutil import rmtree
 from sys import stderr, stdin, stdout
+from tempfile import mkdtemp
 from time import sleep
+import sqlite3
 
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
@@ -20,11 +28,186 @@ QUOTA_MIN = 12  # costs of highest request
 
 TEMPFILE = "./.TEMPFILE.json"
 
-
-def video(video_identifiers):
-    for video_ids in video_identifiers:
-        for video_id in video_ids.split():
-            yield video_id
+DONE_FILE = "./done_ids"  # IDs already retrieved; skipped if present
+
+# Video IDs are 11 characters of URL-safe base64 encoding 64 bits, so the
+# last character only carries 4 bits and must be one of 16 values.
+VIDEO_ID_PATTERN = re_compile(r"^[A-Za-z0-9_-]{10}[AEIMQUYcgkosw048]$")
+
+# Method to detect duplicate IDs in the input; IDs in DONE_FILE are always
+# matched exactly. Drops by the Bloom filter are reported as probabilistic,
+# as some of them may be false positives.
+DEDUP_METHODS = ("exact", "bloom")
+DEDUP_METHOD = "exact"  # "exact" (spills to disk) or "bloom"
+SEEN_MEMORY_MAX = 1000000  # IDs kept in memory before spilling to disk
+SPILL_DIR = "."  # where spilled IDs are stored; avoid RAM-backed /tmp
+BLOOM_CAPACITY = 50000000  # expected number of unique IDs
+BLOOM_ERROR_RATE = 0.0001  # false positive rate
+
+
+class ExactSet:
+    """ Exact set of IDs which moves its members to an on-disk SQLite
+        database once max_memory of them are held in memory.
+    """
+    def __init__(self, max_memory=None):
+        if max_memory is None:
+            max_memory = SEEN_MEMORY_MAX
+
+        self.max_memory = max_memory
+        self.members = set()
+        self.spill_dir = None
+        self.spill = None
+
+    def __contains__(self, key):
+        if key in self.members:
+            return True
+
+        return self.spill is not None and self.spill.execute(
+            "SELECT 1 FROM ids WHERE id = ?", (key,)).fetchone() is not None
+
+    def add(self, key):
+        """ Add key and return True if it was not a member yet """
+        if key in self:
+            return False
+
+        self.members.add(key)
+        if len(self.members) >= self.max_memory:
+            self._flush()
+
+        return True
+
+    def _flush(self):
+        if self.spill is None:
+            self.spill_dir = mkdtemp(prefix=".seen_ids", dir=SPILL_DIR)
+            self.spill = sqlite3.connect(join(self.spill_dir, "ids.sqlite"))
+            self.spill.execute("PRAGMA journal_mode = OFF")
+            self.spill.execute("PRAGMA synchronous = OFF")
+            self.spill.execute("CREATE TABLE ids (id TEXT PRIMARY KEY) WITHOUT ROWID")
+
+        with self.spill:
+            self.spill.executemany("INSERT OR IGNORE INTO ids VALUES (?)",
+                                   ((key,) for key in self.members))
+        self.members.clear()
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+            rmtree(self.spill_dir, ignore_errors=True)
+            self.spill = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class BloomFilter:
+    """ Probabilistic set of IDs with a fixed memory footprint, sized for
+        capacity members at the given false positive rate.
+    """
+    def __init__(self, capacity=None, error_rate=None):
+        if capacity is None:
+            capacity = BLOOM_CAPACITY
+        if error_rate is None:
+            error_rate = BLOOM_ERROR_RATE
+
+        self.size = ceil(-capacity * log(error_rate) / log(2)**2)
+        self.num_hashes = max(1, round(self.size / capacity * log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # double hashing: derive all positions from two 64 bit hashes
+        digest = blake2b(key.encode('utf8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.size
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7))
+                   for p in self._positions(key))
+
+    def add(self, key):
+        """ Add key and return True if it was (probably) not a member yet """
+        new = False
+        for p in self._positions(key):
+            if not self.bits[p >> 3] & (1 << (p & 7)):
+                self.bits[p >> 3] |= 1 << (p & 7)
+                new = True
+
+        return new
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def make_id_set(method=None):
+    if method is None:
+        method = DEDUP_METHOD
+
+    if method == "exact":
+        return ExactSet(SEEN_MEMORY_MAX)
+    if method == "bloom":
+        return BloomFilter(BLOOM_CAPACITY, BLOOM_ERROR_RATE)
+
+    raise ValueError("Unknown deduplication method: %s" % (method))
+
+def tokens(lines):
+    for line in lines:
+        for token in line.split():
+            yield token
+
+def read_done_ids(donefile):
+    done = ExactSet(SEEN_MEMORY_MAX)
+    try:
+        if exists(donefile):
+            with open(donefile, "r") as df:
+                for video_id in tokens(df):
+                    done.add(video_id)
+    except BaseException:
+        done.close()
+        raise
+
+    return done
+
+def video(video_identifiers, donefile=None, method=None):
+    """ Return an iterator over each valid video ID once, skipping those
+        listed in donefile, which reports the number of dropped IDs per
+        reason when exhausted.
+    """
+    if donefile is None:
+        donefile = DONE_FILE
+    if method is None:
+        method = DEDUP_METHOD
+
+    # fail before the done file is loaded or any video is requested
+    if method not in DEDUP_METHODS:
+        raise ValueError("Unknown deduplication method: %s" % (method))
+
+    return filter_videos(video_identifiers, donefile, method)
+
+def filter_videos(video_identifiers, donefile, method):
+    duplicate = "duplicate" if method == "exact" else "duplicate (probabilistic)"
+    dropped = Counter()
+    try:
+        with make_id_set(method) as seen, read_done_ids(donefile) as done:
+            for video_id in tokens(video_identifiers):
+                if VIDEO_ID_PATTERN.match(video_id) is None:
+                    dropped['malformed'] += 1
+                elif video_id in done:
+                    dropped['already retrieved'] += 1
+                elif not seen.add(video_id):
+                    dropped[duplicate] += 1
+                else:
+                    yield video_id
+    finally:
+        for reason, count in sorted(dropped.items()):
+            stderr.write("Dropped %d %s video IDs\n" % (count, reason))
 
 def read_developer_key(keyfile):
     key = None
@@ -102,12 +285,14 @@ def save_progress(data):
         dump(data, f, indent=4)
 
 def main(quota=False):
+    videos = video(stdin)
+
     developer_key = read_developer_key(DEVELOPER_KEY_FILE)
     service = build_service_object(API_SERVICE_NAME, API_VERSION, developer_key)
 
     costs = 0
     data = dict()
-    for video_id in video(stdin):
+    for video_id in videos:
         if quota and costs >= QUOTA_DEFAULT - QUOTA_MIN:
             save_progress(data)
             costs = 0
@@ -0,0 +1,189 @@
+from io import StringIO
+from math import log
+from os.path import dirname, exists
+from types import ModuleType
+import sys
+
+import pytest
+
+# only the input stage is tested here, so stub the API client dependencies
+# if they are not installed, and only while importing getYTmetadata
+STUBS = {
+    "googleapiclient": dict(),
+    "googleapiclient.discovery": {"build": None},
+    "googleapiclient.errors": {"HttpError": Exception},
+    "requests": {"exceptions": None},
+}
+
+stubbed = list()
+for name, attributes in STUBS.items():
+    try:
+        __import__(name)
+    except ImportError:
+        stub = ModuleType(name)
+        stub.__dict__.update(attributes)
+        sys.modules[name] = stub
+        stubbed.append(name)
+
+try:
+    import getYTmetadata as ytm
+finally:
+    for name in stubbed:
+        del sys.modules[name]
+
+
+VALID_IDS = ["dQw4w9WgXcQ", "9bZkp7q19f0", "jNQXAC9IVRw", "_OBlgSz8sSM"]
+
+
+@pytest.fixture(autouse=True)
+def spill_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ytm, "SPILL_DIR", str(tmp_path))
+    return tmp_path
+
+@pytest.mark.parametrize("video_id", VALID_IDS)
+def test_pattern_accepts_video_ids(video_id):
+    assert ytm.VIDEO_ID_PATTERN.match(video_id)
+
+@pytest.mark.parametrize("video_id", [
+    "dQw4w9WgXc",     # too short
+    "dQw4w9WgXcQQ",   # too long
+    "dQw4w9WgX+Q",    # not URL-safe base64
+    "dQw4w9WgXcR",    # last character carries more than 4 bits
+    "dQw4w9WgXc_",
+])
+def test_pattern_rejects_malformed_ids(video_id):
+    assert ytm.VIDEO_ID_PATTERN.match(video_id) is None
+
+def test_exact_set_spills_to_disk(spill_dir):
+    keys = ["%011d" % i for i in range(25)]
+    with ytm.ExactSet(max_memory=10) as s:
+        assert all(s.add(key) for key in keys)
+        assert s.spill is not None
+        assert len(s.members) == 5
+        assert dirname(s.spill_dir) == str(spill_dir)
+
+        assert all(key in s for key in keys)
+        assert "%011d" % 25 not in s
+        assert not s.add(keys[0])   # spilled
+        assert not s.add(keys[-1])  # in memory
+
+    assert s.spill is None
+    assert not exists(s.spill_dir)
+
+def test_exact_set_without_spill():
+    with ytm.ExactSet(max_memory=10) as s:
+        assert s.add("a")
+        assert not s.add("a")
+        assert s.spill is None
+
+def test_bloom_filter_sizing():
+    b = ytm.BloomFilter(capacity=1000, error_rate=0.01)
+
+    # m = -n ln p / (ln 2)^2 and k = m/n ln 2
+    assert b.size == 9586
+    assert b.num_hashes == 7
+    assert len(b.bits) == (b.size + 7) // 8
+    assert b.num_hashes == round(-log(0.01) / log(2))
+
+def test_bloom_filter_membership():
+    b = ytm.BloomFilter(capacity=1000, error_rate=0.01)
+    keys = ["%011d" % i for i in range(1000)]
+
+    positions = list(b._positions(keys[0]))
+    assert len(positions) == b.num_hashes
+    assert len(set(positions)) > 1
+    assert all(0 <= p < b.size for p in positions)
+
+    assert all(b.add(key) for key in keys[:10])
+    for key in keys[10:]:
+        b.add(key)
+    assert all(key in b for key in keys)
+    assert not b.add(keys[0])
+
+    others = ["x%010d" % i for i in range(10000)]
+    false_positives = sum(key in b for key in others)
+    assert false_positives < 0.02 * len(others)
+
+def test_read_done_ids(tmp_path):
+    donefile = tmp_path / "done_ids"
+    donefile.write_text("%s %s\n%s\n" % tuple(VALID_IDS[:3]))
+
+    with ytm.read_done_ids(str(donefile)) as done:
+        assert all(video_id in done for video_id in VALID_IDS[:3])
+        assert VALID_IDS[3] not in done
+
+    with ytm.read_done_ids(str(tmp_path / "missing")) as done:
+        assert VALID_IDS[0] not in done
+
+def test_read_done_ids_cleans_up_on_error(tmp_path, monkeypatch):
+    donefile = tmp_path / "done_ids"
+    donefile.write_text("\n".join("%011d" % i for i in range(20)))
+
+    created = list()
+    class FailingSet(ytm.ExactSet):
+        def __init__(self, max_memory=None):
+            super().__init__(max_memory)
+            created.append(self)
+
+        def add(self, key):
+            if self.spill is not None:
+                raise KeyboardInterrupt
+            return super().add(key)
+
+    monkeypatch.setattr(ytm, "ExactSet", FailingSet)
+    monkeypatch.setattr(ytm, "SEEN_MEMORY_MAX", 5)
+    with pytest.raises(KeyboardInterrupt):
+        ytm.read_done_ids(str(donefile))
+
+    assert created[0].max_memory == 5
+    assert created[0].spill is None
+    assert not exists(created[0].spill_dir)
+
+@pytest.mark.parametrize("method, duplicate", [
+    ("exact", "duplicate"),
+    ("bloom", "duplicate (probabilistic)"),
+])
+def test_video_drops_and_reports(tmp_path, monkeypatch, method, duplicate):
+    report = StringIO()
+    monkeypatch.setattr(ytm, "stderr", report)
+    monkeypatch.setattr(ytm, "BLOOM_CAPACITY", 1000)
+    donefile = tmp_path / "done_ids"
+    donefile.write_text(VALID_IDS[0] + "\n")
+
+    lines = ["%s %s bad\n" % (VALID_IDS[0], VALID_IDS[1]),
+             "%s  %s\n" % (VALID_IDS[1], VALID_IDS[2]),
+             "dQw4w9WgXcR %s\n" % (VALID_IDS[1])]
+
+    assert list(ytm.video(lines, str(donefile), method)) == VALID_IDS[1:3]
+
+    report = report.getvalue()
+    assert "Dropped 1 already retrieved video IDs\n" in report
+    assert "Dropped 2 %s video IDs\n" % (duplicate) in report
+    assert "Dropped 2 malformed video IDs\n" in report
+
+def test_video_reads_settings_at_call_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(ytm, "stderr", StringIO())
+    donefile = tmp_path / "done_ids"
+    donefile.write_text(VALID_IDS[0] + "\n")
+    monkeypatch.setattr(ytm, "DONE_FILE", str(donefile))
+    monkeypatch.setattr(ytm, "DEDUP_METHOD", "bloom")
+    monkeypatch.setattr(ytm, "BLOOM_CAPACITY", 1000)
+    size = ytm.BloomFilter(1000).size
+
+    created = list()
+    class RecordingFilter(ytm.BloomFilter):
+        def __init__(self, capacity=None, error_rate=None):
+            super().__init__(capacity, error_rate)
+            created.append(self)
+
+    monkeypatch.setattr(ytm, "BloomFilter", RecordingFilter)
+    assert list(ytm.video(VALID_IDS[:2])) == VALID_IDS[1:2]
+    assert created[0].size == size
+
+def test_video_unknown_method(tmp_path, monkeypatch):
+    def read_done_ids(donefile):
+        raise AssertionError("done file read before checking method")
+
+    monkeypatch.setattr(ytm, "read_done_ids", read_done_ids)
+    with pytest.raises(ValueError):
+        ytm.video([], str(tmp_path / "missing"), "unknown")